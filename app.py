@@ -4,8 +4,8 @@ Content Processing Automation Project - Final Solution
 
 Purpose:
 This script uses the most robust methods discovered:
-1. INPUT: Simulates a user copy-pasting the entire text via the clipboard
-   to bypass input limits.
+1. INPUT: Sets the entire text on the textarea in a single JavaScript call
+   (native value setter + input event) to bypass input limits.
 2. OUTPUT: Waits for the H3 signal and then extracts the complete, decoded
    JSON from the copy button's data attribute.
 """
@@ -13,19 +13,30 @@ This script uses the most robust methods discovered:
 import streamlit as st
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import WebDriverException, TimeoutException
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
+import soupsieve as sv
 import json
+import functools
+import collections
 import time
-import html
+import contextlib
+import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
 from datetime import datetime
 import pytz
-import platform
+
+# Keep per-command WebDriver and connection-pool chatter out of the logs even if the root logger is set to DEBUG.
+logging.getLogger('selenium.webdriver.remote.remote_connection').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
 
 # --- Streamlit Page Configuration ---
 st.set_page_config(page_title="Content Processor", page_icon="🚀", layout="wide")
@@ -33,112 +44,257 @@ st.title("🚀 Content Processing Automation")
 st.markdown("Enter a URL to scrape its content, process it, and extract the resulting JSON using the final, stable logic.")
 
 # --- Component 1: The Original Content Extractor Class ---
+# Compiled once at import rather than re-resolved through BeautifulSoup's select() on every page.
+MAIN_CONTAINER_SELECTORS = tuple(sv.compile(selector) for selector in ('article', 'main', '.content', '#content', '[role="main"]'))
+SUBTITLE_SELECTOR = sv.compile('.sub-title,.subtitle,[class*="sub-title"],[class*="subtitle"]')
+LEAD_SELECTOR = sv.compile('.lead,[class*="lead"]')
+
+# Only the connection pool is shared across runs and sessions, so repeat fetches to the same host reuse
+# keep-alive connections. urllib3's pool is thread-safe; cookies stay in each run's own Session.
+@st.cache_resource(show_spinner=False)
+def get_http_adapter():
+    return HTTPAdapter(pool_connections=10, pool_maxsize=20)
+
 class ContentExtractor:
+    MAX_RESPONSE_BYTES = 5 * 1024 * 1024
     def __init__(self):
-        self.session = requests.Session()
+        self.session = requests.Session(); adapter = get_http_adapter()
+        self.session.mount('https://', adapter); self.session.mount('http://', adapter)
         self.session.headers.update({'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'})
     def extract_content(self, url):
-        try:
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            content_parts = []; main_container_selectors = ['article', 'main', '.content', '#content', '[role="main"]']; main_container = None
-            for selector in main_container_selectors:
-                main_container = soup.select_one(selector)
-                if main_container: break
-            if not main_container:
-                if len(soup.find_all('p')) > 3: main_container = soup.find_all('p')[0].parent
-                else: main_container = soup.body
-            for h1 in soup.find_all('h1'):
-                text = h1.get_text(separator='\n', strip=True)
-                if text: content_parts.append(f'H1: {text}')
-            for st_element in soup.select('.sub-title,.subtitle,[class*="sub-title"],[class*="subtitle"]'):
-                text = st_element.get_text(separator='\n', strip=True)
-                if text: content_parts.append(f'SUBTITLE: {text}')
-            for lead in soup.select('.lead,[class*="lead"]'):
-                text = lead.get_text(separator='\n', strip=True)
-                if text: content_parts.append(f'LEAD: {text}')
-            if main_container:
-                main_text = main_container.get_text(separator='\n', strip=True)
-                if main_text: content_parts.append(f'CONTENT: {main_text}')
-            return True, '\n\n'.join(content_parts) or "No content found", None
-        except requests.RequestException as e:
-            return False, None, f"Error fetching URL: {e}"
+        try: return True, self.parse_page(url), None
+        except requests.RequestException as e: return False, None, f"Error fetching URL: {e}"
+    # Streamlit reruns the script on every interaction, so remember each URL's text for an hour.
+    # Fetch errors propagate out of here and are therefore never cached. `_self` is excluded from the cache key.
+    @st.cache_data(ttl=3600, show_spinner=False)
+    def parse_page(_self, url):
+        # Stream the body and stop at a size cap so an oversized page is never downloaded or parsed in full.
+        with _self.session.get(url, timeout=30, stream=True) as response:
+            response.raise_for_status(); body = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                body.extend(chunk)
+                if len(body) >= _self.MAX_RESPONSE_BYTES: break
+        if len(body) >= _self.MAX_RESPONSE_BYTES and (last_tag_end := body.rfind(b'>')) != -1:
+            # Cut a capped body at its last complete tag so the parser doesn't see a half-written element.
+            del body[last_tag_end + 1:]
+        # Trust a charset the server declares so BeautifulSoup can skip its own encoding detection.
+        declared_encoding = response.encoding if 'charset=' in response.headers.get('Content-Type', '').lower() else None
+        soup = BeautifulSoup(bytes(body), 'lxml', from_encoding=declared_encoding)
+        for tag in soup(['script', 'style', 'noscript']): tag.decompose()
+        content_parts = []; main_container = None
+        for selector in MAIN_CONTAINER_SELECTORS:
+            main_container = selector.select_one(soup)
+            if main_container: break
+        if not main_container:
+            paragraphs = soup.find_all('p', limit=4)
+            if len(paragraphs) > 3: main_container = paragraphs[0].parent
+            else: main_container = soup.body
+        for h1 in soup.find_all('h1'):
+            text = h1.get_text(separator='\n', strip=True)
+            if text: content_parts.append(f'H1: {text}')
+        for st_element in SUBTITLE_SELECTOR.select(soup):
+            text = st_element.get_text(separator='\n', strip=True)
+            if text: content_parts.append(f'SUBTITLE: {text}')
+        for lead in LEAD_SELECTOR.select(soup):
+            text = lead.get_text(separator='\n', strip=True)
+            if text: content_parts.append(f'LEAD: {text}')
+        if main_container:
+            main_text = main_container.get_text(separator='\n', strip=True)
+            if main_text: content_parts.append(f'CONTENT: {main_text}')
+        return '\n\n'.join(content_parts) or "No content found"
 
 # --- Component 2: The Final Selenium Interaction Logic ---
+CHUNKER_URL = "https://chunk.dejan.ai/"
+TEXTAREA_LOCATOR = (By.CSS_SELECTOR, 'textarea[aria-label="Text to chunk:"]')
+SUBMIT_BUTTON_LOCATOR = (By.CSS_SELECTOR, '[data-testid="stBaseButton-secondary"]')
+# One XPath covers both signals: the results header exists and its copy button has rendered after it.
+RESULT_COPY_BUTTON_XPATH = "//h3[text()='Raw JSON Output']/following::button[@data-testid='stCodeCopyButton']"
+# 120 s for the results section to render plus 10 s for its copy button to receive the full JSON.
+RESULT_TIMEOUT_MS = 130000
+
 def get_stable_chrome_options():
     chrome_options = Options()
     chrome_options.add_argument('--headless=new')
     chrome_options.add_argument('--no-sandbox')
     chrome_options.add_argument('--disable-dev-shm-usage')
-    # Grant clipboard permissions for headless mode
-    chrome_options.add_experimental_option("prefs", {"profile.default_content_setting_values.clipboard": 1})
+    chrome_options.add_argument('--log-level=3')
+    # The workflow only needs the textarea, button and results; skip image decoding and notification prompts.
+    chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+    chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2, "profile.default_content_setting_values.notifications": 2})
     return chrome_options
 
+# Third-party analytics and web fonts that chunk.dejan.ai pulls in but the workflow never uses.
+BLOCKED_URL_PATTERNS = ['*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*fonts.googleapis.com*', '*fonts.gstatic.com*']
+
+def block_unneeded_requests(driver):
+    driver.execute_cdp_cmd('Network.enable', {}); driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+
+# One headless Chrome per server process, reused across runs and reruns instead of a cold start per click.
+@st.cache_resource(show_spinner=False)
+def get_shared_driver():
+    driver = webdriver.Chrome(options=get_stable_chrome_options()); atexit.register(driver.quit)
+    # Bounds how long a run can hold the browser lock waiting on an unresponsive chunker page.
+    driver.set_page_load_timeout(60)
+    return driver
+
+# Selenium sessions are not safe to drive from two Streamlit sessions at once.
+@st.cache_resource(show_spinner=False)
+def get_driver_lock():
+    return threading.Lock()
+
+# Sends commands to the shared browser and may replace it, so only call it while holding get_driver_lock().
 def setup_driver():
-    try: return webdriver.Chrome(options=get_stable_chrome_options())
+    try:
+        driver = get_shared_driver()
+        try: driver.window_handles
+        except WebDriverException:
+            # The cached browser crashed or was closed; replace it rather than failing this run.
+            get_shared_driver.clear()
+            atexit.unregister(driver.quit)
+            with contextlib.suppress(Exception): driver.quit()
+            driver = get_shared_driver()
+        return driver
     except WebDriverException as e: st.error(f"❌ WebDriver Initialization Failed: {e}"); return None
 
+# Resolves as soon as the results copy button exists and its attribute holds a complete JSON object, or with
+# null after timeoutMs. One observer covers both the button appearing and its attribute filling in.
+# HTML entities are decoded by the browser's own parser (textarea RCDATA) instead of html.unescape in Python.
+# The button is re-queried on every mutation, so a Streamlit re-render cannot leave it observing a stale node.
+WAIT_FOR_COMPLETE_JSON_ATTRIBUTE_JS = """
+const xpath = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+const decode = (raw) => {
+    if (!raw.includes('&')) return raw;
+    const scratch = document.createElement('textarea'); scratch.innerHTML = raw; return scratch.value;
+};
+const read = () => {
+    const button = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    const raw = (button && button.getAttribute('data-clipboard-text')) || '', stripped = raw.trim();
+    return stripped.startsWith('{') && stripped.endsWith('}') ? decode(raw) : null;
+};
+const initial = read();
+if (initial !== null) return done(initial);
+const observer = new MutationObserver(() => {
+    const value = read();
+    if (value !== null) { observer.disconnect(); clearTimeout(timer); done(value); }
+});
+const timer = setTimeout(() => { observer.disconnect(); done(null); }, timeoutMs);
+observer.observe(document.body, {subtree: true, childList: true, attributes: true, attributeFilter: ['data-clipboard-text']});
+"""
+
 def extract_from_button_attribute(driver, log_callback):
     try:
-        h3_xpath = "//h3[text()='Raw JSON Output']"; wait = WebDriverWait(driver, 120); log_callback("🔄 Waiting for results section to appear...")
-        wait.until(EC.presence_of_element_located((By.XPATH, h3_xpath))); log_callback("✅ Results section is visible.")
-        button_selector = "button[data-testid='stCodeCopyButton']"; log_callback("...Waiting for the copy button...")
-        copy_button = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, button_selector))); log_callback("✅ Found the copy button element.")
-        log_callback("...Polling button attribute for completeness..."); timeout = time.time() + 10; final_content = ""
-        while time.time() < timeout:
-            raw_content = copy_button.get_attribute('data-clipboard-text')
-            if raw_content and raw_content.strip().startswith('{') and raw_content.strip().endswith('}'):
-                final_content = raw_content; break
-            time.sleep(0.2)
-        if not final_content: log_callback("❌ Timed out polling the attribute."); return None
-        log_callback("...Decoding HTML entities..."); decoded_content = html.unescape(final_content)
-        log_callback(f"✅ Extraction complete. Retrieved {len(decoded_content):,} characters.")
-        return decoded_content
+        log_callback("🔄 Waiting for the results section's copy button to hold complete, decoded JSON...")
+        driver.set_script_timeout(RESULT_TIMEOUT_MS / 1000 + 5)
+        final_content = driver.execute_async_script(WAIT_FOR_COMPLETE_JSON_ATTRIBUTE_JS, RESULT_COPY_BUTTON_XPATH, RESULT_TIMEOUT_MS)
+        if not final_content: log_callback("❌ Timed out waiting for the results."); return None
+        log_callback(f"✅ Extraction complete. Retrieved {len(final_content):,} decoded characters.")
+        return final_content
     except Exception as e: log_callback(f"❌ An error occurred during extraction: {e}"); return None
 
+# Chunker output keyed by a SHA-256 of the submitted text. Identical content always chunks to the same JSON,
+# so the cache is shared by every session, bounded in size and expired after an hour.
+RESULTS_CACHE_MAX_ENTRIES = 128
+RESULTS_CACHE_TTL_SECONDS = 3600
+
+@st.cache_resource(show_spinner=False)
+def get_results_cache():
+    return collections.OrderedDict(), threading.Lock()
+
+def get_cached_result(content_key):
+    cache, lock = get_results_cache()
+    with lock:
+        entry = cache.get(content_key)
+        if not entry: return None
+        if time.monotonic() - entry[0] > RESULTS_CACHE_TTL_SECONDS: del cache[content_key]; return None
+        cache.move_to_end(content_key); return entry[1]
+
+def store_result(content_key, result):
+    cache, lock = get_results_cache()
+    with lock:
+        cache[content_key] = (time.monotonic(), result); cache.move_to_end(content_key)
+        while len(cache) > RESULTS_CACHE_MAX_ENTRIES: cache.popitem(last=False)
+
+@functools.lru_cache(maxsize=16)
+def is_valid_json(content):
+    stripped = content.strip()
+    if not stripped or stripped[0] not in '{[' or stripped[-1] not in '}]': return False
+    try: json.loads(stripped); return True
+    except ValueError: return False
+
+SET_TEXTAREA_VALUE_JS = """
+const el = arguments[0], value = arguments[1];
+el.focus();
+Object.getOwnPropertyDescriptor(window.HTMLTextAreaElement.prototype, 'value').set.call(el, value);
+el.dispatchEvent(new Event('input', {bubbles: true}));
+el.dispatchEvent(new Event('change', {bubbles: true}));
+"""
+
+def submit_and_extract(driver, content_to_submit, log_callback):
+    wait = WebDriverWait(driver, 20)
+    log_callback("Locating text area..."); input_field = wait.until(EC.element_to_be_clickable(TEXTAREA_LOCATOR))
+
+    # One round trip for the whole text. React tracks the native value setter, so assign through it
+    # and dispatch the events it listens for; focusing first lets the submit click blur-commit the value.
+    log_callback("Setting the full text via JavaScript...")
+    driver.execute_script(SET_TEXTAREA_VALUE_JS, input_field, content_to_submit)
+    log_callback("✅ Text set in the input field.")
+
+    log_callback("Clicking submit button..."); submit_button = wait.until(EC.element_to_be_clickable(SUBMIT_BUTTON_LOCATOR)); submit_button.click()
+
+    return extract_from_button_attribute(driver, log_callback)
+
+def load_chunker_in_background(driver):
+    pool = ThreadPoolExecutor(max_workers=1); page_load = pool.submit(driver.get, CHUNKER_URL); pool.shutdown(wait=False)
+    return page_load
+
+def close_chunker_tab(driver, base_handle, page_load):
+    # Runs while the browser lock is held, so it makes no Streamlit calls (they raise after a Stop).
+    if page_load:
+        with contextlib.suppress(Exception): page_load.result()
+    with contextlib.suppress(WebDriverException): driver.delete_all_cookies()
+    # Handle order isn't guaranteed, so only close a tab that isn't the saved base tab.
+    with contextlib.suppress(WebDriverException):
+        if driver.current_window_handle != base_handle: driver.close()
+    with contextlib.suppress(WebDriverException): driver.switch_to.window(base_handle)
+
 def main_workflow(url):
-    driver = None; log_messages = []; log_container = st.empty()
+    driver = None; base_handle = None; page_load = None; lock = get_driver_lock(); log_messages = []; log_container = st.empty()
     def log_callback(message):
         utc_now = datetime.now(pytz.utc); cest_tz = pytz.timezone('Europe/Malta'); cest_now = utc_now.astimezone(cest_tz)
         log_messages.append(f"`{cest_now.strftime('%H:%M:%S')} (CEST) / {utc_now.strftime('%H:%M:%S')} (UTC)`: {message}")
         log_container.info("\n\n".join(log_messages))
+    def open_chunker_tab():
+        nonlocal driver, base_handle, page_load
+        log_callback("Acquiring the shared browser..."); driver = setup_driver()
+        if not driver: return
+        # Each run gets its own tab; the URL blocklist is per tab, so it is applied to every new one.
+        base_handle = driver.current_window_handle; driver.switch_to.new_window('tab'); block_unneeded_requests(driver)
+        log_callback("Loading `chunk.dejan.ai` in the background..."); page_load = load_chunker_in_background(driver)
+    # This thread alone owns the browser lock and releases it in the finally below. Take it now only if it
+    # is free, so the chunker loads while the URL is scraped; otherwise queue for it only on a cache miss.
+    owns_browser = lock.acquire(blocking=False)
     try:
+        if owns_browser: open_chunker_tab()
         log_callback("Initializing ContentExtractor..."); extractor = ContentExtractor()
         log_callback(f"Extracting content from: {url}")
         success, content_to_submit, error = extractor.extract_content(url)
         if not success: log_callback(f"🔥 FAILED to extract content: {error}"); return
         log_callback(f"✅ Content extracted successfully ({len(content_to_submit):,} chars).")
-        
-        log_callback("Initializing browser with clipboard access..."); driver = setup_driver()
-        if not driver: return
-        log_callback("Navigating to `chunk.dejan.ai`..."); driver.get("https://chunk.dejan.ai/"); wait = WebDriverWait(driver, 20)
-        
-        # --- NEW COPY-PASTE LOGIC ---
-        log_callback("Using JavaScript to copy full text to clipboard...")
-        # This JS command uses the modern clipboard API to place the text
-        # The text is passed as a parameter to avoid issues with quotes in the script
-        driver.execute_script("navigator.clipboard.writeText(arguments[0]);", content_to_submit)
-        log_callback("✅ Content copied to browser's clipboard.")
-
-        log_callback("Locating text area and clearing it...")
-        textarea_selector = (By.CSS_SELECTOR, 'textarea[aria-label="Text to chunk:"]')
-        input_field = wait.until(EC.element_to_be_clickable(textarea_selector))
-        input_field.clear()
-        
-        log_callback("Simulating a 'Paste' (Ctrl+V) command...")
-        # Determine the correct modifier key for the OS (Cmd for Mac, Ctrl for others)
-        modifier_key = Keys.COMMAND if platform.system() == "Darwin" else Keys.CONTROL
-        input_field.send_keys(modifier_key, "v")
-        log_callback("✅ Paste command sent successfully.")
-
-        log_callback("Clicking submit button..."); submit_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, '[data-testid="stBaseButton-secondary"]'))); submit_button.click()
-        
-        extracted_content = extract_from_button_attribute(driver, log_callback)
+
+        content_key = hashlib.sha256(content_to_submit.encode('utf-8')).hexdigest()
+        extracted_content = get_cached_result(content_key)
+        if extracted_content: log_callback("♻️ This exact content was processed recently. Reusing the cached result.")
+        else:
+            if not owns_browser:
+                log_callback("Waiting for the shared browser to be free..."); lock.acquire(); owns_browser = True
+                open_chunker_tab()
+            if driver:
+                page_load.result(); extracted_content = submit_and_extract(driver, content_to_submit, log_callback)
+                if extracted_content: store_result(content_key, extracted_content)
 
         if extracted_content:
-            st.success("🎉 **Workflow Complete!**"); is_valid_json = json.loads(extracted_content) is not None
-            col1, col2 = st.columns(2); col1.metric("Characters Extracted", f"{len(extracted_content):,}"); col2.metric("Is Valid JSON?", "✅ Yes" if is_valid_json else "❌ No")
+            st.success("🎉 **Workflow Complete!**"); valid_json = is_valid_json(extracted_content)
+            col1, col2 = st.columns(2); col1.metric("Characters Extracted", f"{len(extracted_content):,}"); col2.metric("Is Valid JSON?", "✅ Yes" if valid_json else "❌ No")
             with st.expander("📋 View Extracted JSON", expanded=True): st.code(extracted_content, language='json')
             st.download_button("💾 Download Full Extracted JSON", data=extracted_content, file_name="extracted_content.json", mime="application/json")
         else:
@@ -146,7 +302,11 @@ def main_workflow(url):
     except Exception as e:
         log_callback(f"💥 An unexpected error occurred in the main workflow: {e}")
     finally:
-        if driver: log_callback("Cleaning up and closing browser instance."); driver.quit(); log_callback("✅ Workflow finished.")
+        if owns_browser:
+            try:
+                if base_handle: close_chunker_tab(driver, base_handle, page_load)
+            finally: lock.release()
+        if driver: log_callback("✅ Workflow finished.")
 
 # --- Streamlit UI ---
 st.subheader("Enter URL to Process")